@@ -1,21 +1,114 @@
 import requests
-import pandas as pd
-import re
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import ReadTimeoutError
 import urllib3
+import orjson
 import streamlit as st
 from datetime import datetime
-import locale
+import calendar
+import html
+import time
+import sqlite3
+import threading
 import concurrent.futures # [★최적화★] 병렬 처리를 위한 라이러리 임포트
 
-# 한국어 로케일 설정 (Streamlit Cloud 등 일부 환경에서는 필요할 수 있음)
-try:
-    locale.setlocale(locale.LC_ALL, 'ko_KR.UTF-8')
-except locale.Error:
-    # 로케일 설정이 실패해도 앱은 계속 실행되도록 예외 처리
-    pass
+# [★최적화★] 프로세스 전역 설정은 스크립트 재실행마다 반복하지 않고 한 번만 적용합니다.
+@st.cache_resource
+def init_process_settings():
+    # SSL 경고 메시지 비활성화
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return True
+
+init_process_settings()
+
+class NoReadTimeoutRetry(Retry):
+    """읽기 타임아웃만 재시도하지 않는 Retry.
+
+    끊어진 keep-alive 연결(RemoteDisconnected 등)도 urllib3에서는 읽기 오류로 분류되므로
+    read 횟수를 0으로 막지 않고, 타임아웃일 때만 바로 예외를 올립니다.
+    """
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            raise error
+        return super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+# [★최적화★] 모든 NEIS 호출이 공유하는 세션 (TCP/TLS 연결 재사용)
+# cache_resource로 보관하여 스크립트가 재실행되어도 연결 풀이 유지됩니다.
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        # 연결 실패, 끊어진 keep-alive 연결, 일시적인 5xx는 재시도합니다. 읽기 타임아웃과
+        # 429(호출 제한)는 재시도하지 않아, 느린 응답이 클릭마다 timeout의 몇 배로 늘어나거나
+        # 호출 제한 중인 서버에 부하를 더하지 않습니다.
+        max_retries=NoReadTimeoutRetry(total=2, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Accept-Encoding/Connection은 requests 기본값(gzip 등 압축, keep-alive)을 그대로 사용합니다.
+    session.headers["User-Agent"] = "taebaek-meal/1.0"
+    return session
+
+SESSION = get_session()
+
+# [★최적화★] 조회용 스레드 풀도 프로세스 전체에서 하나만 만들어 재사용합니다.
+# 버튼을 누를 때마다 스레드를 새로 띄우고 정리하는 비용이 없어집니다.
+@st.cache_resource
+def get_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="neis")
+
+# [★최적화★] 지난 달 급식처럼 더 이상 바뀌지 않는 메뉴는 디스크(SQLite)에 보관합니다.
+# 앱이 재시작되어도 유지되며, 모든 사용자 세션이 함께 사용합니다.
+MENU_STORE_PATH = ".menu_cache.sqlite3"
+# 저장할 최대 (학교, 월) 개수. 넘치면 가장 오래전에 저장한 항목부터 지웁니다.
+MENU_STORE_MAX_ROWS = 2000
+
+@st.cache_resource(show_spinner=False)
+def get_menu_store():
+    conn = sqlite3.connect(MENU_STORE_PATH, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS month_menus (key TEXT PRIMARY KEY, menus BLOB NOT NULL)")
+    conn.commit()
+    return conn, threading.Lock()
+
+def load_stored_month_menus(key):
+    """디스크에 저장된 월별 메뉴를 반환합니다. 없거나 읽을 수 없으면 None을 반환합니다."""
+    try:
+        conn, lock = get_menu_store()
+        with lock:
+            row = conn.execute("SELECT menus FROM month_menus WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    try:
+        return {
+            (date_str, meal_code): tuple((dish_name, allergy_info) for dish_name, allergy_info in dishes)
+            for date_str, meal_code, dishes in orjson.loads(row[0])
+        }
+    except (ValueError, TypeError):
+        # 손상되었거나 형식이 맞지 않는 항목은 없는 것으로 보고 API에서 다시 받아 덮어씁니다.
+        # (orjson.JSONDecodeError도 ValueError의 하위 클래스입니다.)
+        return None
 
-# SSL 경고 메시지 비활성화
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def store_month_menus(key, menus):
+    """월별 메뉴를 디스크에 저장합니다. 저장에 실패해도 조회 결과에는 영향을 주지 않습니다."""
+    payload = orjson.dumps([[date_str, meal_code, dishes] for (date_str, meal_code), dishes in menus.items()])
+    try:
+        conn, lock = get_menu_store()
+        with lock:
+            conn.execute("INSERT OR REPLACE INTO month_menus (key, menus) VALUES (?, ?)", (key, payload))
+            # INSERT OR REPLACE는 새 rowid를 받으므로 rowid가 작을수록 오래전에 저장된 항목입니다.
+            conn.execute(
+                "DELETE FROM month_menus WHERE rowid NOT IN "
+                "(SELECT rowid FROM month_menus ORDER BY rowid DESC LIMIT ?)",
+                (MENU_STORE_MAX_ROWS,),
+            )
+            conn.commit()
+    except sqlite3.Error:
+        pass
 
 # --- API 키 설정 ---
 # st.secrets를 통해 배포 환경의 비밀값을 안전하게 가져옵니다.
@@ -25,6 +118,14 @@ except FileNotFoundError:
     st.error("API 키가 설정되지 않았습니다. Streamlit Secrets에 NEIS_API_KEY를 추가해주세요.")
     st.stop()
 
+# 모든 NEIS 요청에 공통으로 붙는 쿼리 파라미터
+NEIS_COMMON_PARAMS = {"KEY": API_KEY, "Type": "json"}
+
+
+# --- NEIS API 엔드포인트 ---
+# 쿼리 문자열은 requests의 params로 넘겨 학교명 등 한글 값이 올바르게 인코딩되도록 합니다.
+SCHOOL_INFO_URL = "https://open.neis.go.kr/hub/schoolInfo"
+MEAL_INFO_URL = "https://open.neis.go.kr/hub/mealServiceDietInfo"
 
 # --- 조회 대상 설정 (태백지역 학교 목록) ---
 OFFICE_CODE = "K10"
@@ -38,6 +139,9 @@ TAEBAEK_SCHOOLS = [
     "태백라온학교"
 ]
 
+# 진행률 표시줄 최소 갱신 간격 (초)
+PROGRESS_UPDATE_INTERVAL = 0.15
+
 # --- Helper 함수들 ---
 def get_school_category(school_name):
     """학교명을 기반으로 학교급(대분류)을 반환합니다."""
@@ -52,138 +156,229 @@ def get_school_category(school_name):
     else:
         return "기타"
 
-def search_school_code(office_code, school_name):
-    """주어진 학교명으로 학교 코드를 검색하여 반환합니다."""
-    URL = (
-        f"https://open.neis.go.kr/hub/schoolInfo"
-        f"?KEY={API_KEY}&Type=json&pIndex=1&pSize=10"
-        f"&ATPT_OFCDC_SC_CODE={office_code}&SCHUL_NM={school_name}"
-    )
-    try:
-        response = requests.get(URL, timeout=10, verify=False)
-        response.raise_for_status()
-        data = response.json()
-        if 'schoolInfo' in data and 'row' in data['schoolInfo'][1]:
-            schools = data['schoolInfo'][1]['row']
-            for s in schools:
-                if s['SCHUL_NM'] == school_name:
-                    return s['SD_SCHUL_CODE']
-            return schools[0]['SD_SCHUL_CODE']
-    except Exception:
-        return None
+# [★최적화★] 학교급은 학교명으로 고정되므로 시작 시 한 번만 계산해 둡니다.
+SCHOOL_CATEGORIES = {name: get_school_category(name) for name in TAEBAEK_SCHOOLS}
+
+def split_allergy(menu_item):
+    """메뉴명 끝의 알레르기 번호 "(1.5.6)"를 분리하여 (메뉴명, 알레르기 번호)로 반환합니다.
+
+    정규식 대신 문자열 메서드로 한 번만 훑어 처리합니다. 알레르기 번호가 없으면 None을 반환합니다.
+    """
+    if menu_item.endswith(')'):
+        start = menu_item.rfind('(')
+        allergy_info = menu_item[start + 1:-1]
+        if start >= 0 and allergy_info and not allergy_info.strip('0123456789.'):
+            return menu_item[:start].strip(), allergy_info
+    return menu_item.strip(), None
+
+class NeisApiError(Exception):
+    """NEIS API가 오류 결과 코드(ERROR-xxx 등)를 반환했을 때 발생합니다."""
+
+def neis_get(url, params):
+    """NEIS API를 호출하여 JSON 응답을 반환합니다.
+
+    HTTP 오류나 NEIS 오류 코드는 예외로 전달되어, 캐시된 함수가 일시적인 실패를 저장하지 않도록 합니다.
+    '해당하는 데이터가 없습니다'(INFO-200)는 정상 응답으로 취급합니다.
+    """
+    # verify=False는 요청마다 넘깁니다. (세션 속성은 REQUESTS_CA_BUNDLE 등 환경변수에 밀려 무시될 수 있음)
+    response = SESSION.get(url, params={**NEIS_COMMON_PARAMS, **params}, timeout=10, verify=False)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    result = data.get('RESULT')
+    if result and result.get('CODE') not in ('INFO-000', 'INFO-200'):
+        raise NeisApiError(f"{result.get('CODE')}: {result.get('MESSAGE')}")
+    return data
+
+# [★최적화★] 학교 코드는 사실상 고정값이므로 30일 동안 캐시합니다.
+# 네트워크 오류는 예외로 전달되어 캐시에 남지 않습니다.
+@st.cache_data(ttl=60 * 60 * 24 * 30, show_spinner=False)
+def fetch_school_code(office_code, school_name):
+    """schoolInfo API에서 학교명으로 학교 코드를 검색하여 반환합니다."""
+    params = {
+        "pSize": 3,
+        "ATPT_OFCDC_SC_CODE": office_code, "SCHUL_NM": school_name,
+    }
+    data = neis_get(SCHOOL_INFO_URL, params)
+    if 'schoolInfo' in data and 'row' in data['schoolInfo'][1]:
+        schools = data['schoolInfo'][1]['row']
+        for s in schools:
+            if s['SCHUL_NM'] == school_name:
+                return s['SD_SCHUL_CODE']
+        return schools[0]['SD_SCHUL_CODE']
     return None
 
-def fetch_meal_menu(office_code, school_code, date_str, meal_code):
-    """선택된 날짜와 식사종류의 메뉴를 조회하고 리스트로 반환합니다."""
-    URL = (
-        f"https://open.neis.go.kr/hub/mealServiceDietInfo"
-        f"?KEY={API_KEY}&Type=json&pIndex=1&pSize=10"
-        f"&ATPT_OFCDC_SC_CODE={office_code}&SD_SCHUL_CODE={school_code}"
-        f"&MLSV_YMD={date_str}&MMEAL_SC_CODE={meal_code}"
-    )
-    try:
-        response = requests.get(URL, timeout=10, verify=False)
-        response.raise_for_status()
-        data = response.json()
-        if 'mealServiceDietInfo' in data and 'row' in data['mealServiceDietInfo'][1]:
-            record = data['mealServiceDietInfo'][1]['row'][0]
+# [★최적화★] 교육청 소속 학교 전체를 한 번에 받아 학교명 → 코드 딕셔너리로 캐시합니다.
+# 학교마다 schoolInfo를 호출하던 23회의 요청이 (페이지당) 1회로 줄어듭니다.
+@st.cache_data(ttl=60 * 60 * 24 * 30, show_spinner=False)
+def fetch_all_school_codes(office_code):
+    """교육청 소속 전체 학교를 조회하여 {학교명: 학교 코드} 딕셔너리로 반환합니다."""
+    codes = {}
+    page_size = 1000
+    page = 1
+    while True:
+        params = {
+            "pIndex": page, "pSize": page_size,
+            "ATPT_OFCDC_SC_CODE": office_code,
+        }
+        data = neis_get(SCHOOL_INFO_URL, params)
+        if 'schoolInfo' not in data or 'row' not in data['schoolInfo'][1]:
+            break
+        rows = data['schoolInfo'][1]['row']
+        for row in rows:
+            codes.setdefault(row['SCHUL_NM'], row['SD_SCHUL_CODE'])
+        if len(rows) < page_size:
+            break
+        page += 1
+    return codes
+
+def search_school_code(office_code, school_name, school_codes):
+    """주어진 학교명으로 학교 코드를 검색하여 반환합니다.
+
+    미리 조회한 교육청 전체 목록(school_codes)에서 찾고, 정확히 일치하는 이름이 없을 때만
+    학교명 검색(fetch_school_code)을 사용합니다.
+    """
+    school_code = school_codes.get(school_name)
+    if school_code:
+        return school_code
+    return fetch_school_code(office_code, school_name)
+
+# [★최적화★] 한 학교의 한 달치 급식을 한 번에 조회해 1시간 캐시합니다.
+# 같은 달의 다른 날짜/식사를 조회할 때는 네트워크 요청이 발생하지 않습니다.
+# 지난 달의 메뉴는 디스크에도 저장하여 메모리 → 디스크 → API 순서로 찾습니다.
+# (주 단위보다 범위가 넓으면서도 조식/중식/석식 최대 93건이 pSize=100 한 페이지에 들어갑니다.)
+@st.cache_data(ttl=60 * 60, max_entries=1024, show_spinner=False)
+def fetch_month_menus(office_code, school_code, year, month):
+    """해당 월의 급식을 조회하여 {(날짜, 식사코드): ((메뉴명, 알레르기 번호), ...)} 딕셔너리로 반환합니다."""
+    today = datetime.now()
+    is_past_month = (year, month) < (today.year, today.month)
+    store_key = f"{office_code}:{school_code}:{year:04d}{month:02d}"
+    if is_past_month:
+        menus = load_stored_month_menus(store_key)
+        if menus is not None:
+            return menus
+
+    last_day = calendar.monthrange(year, month)[1]
+    params = {
+        "pSize": 100,
+        "ATPT_OFCDC_SC_CODE": office_code, "SD_SCHUL_CODE": school_code,
+        "MLSV_FROM_YMD": f"{year:04d}{month:02d}01",
+        "MLSV_TO_YMD": f"{year:04d}{month:02d}{last_day:02d}",
+    }
+    data = neis_get(MEAL_INFO_URL, params)
+    menus = {}
+    if 'mealServiceDietInfo' in data and 'row' in data['mealServiceDietInfo'][1]:
+        for record in data['mealServiceDietInfo'][1]['row']:
             dish_info = record.get('DDISH_NM', '')
-            dishes = [d.strip() for d in dish_info.split('<br/>') if d.strip()]
-            return dishes
-    except Exception as e:
-        return ["정보를 불러오는 데 실패했습니다."]
-    return ["정보가 없습니다."]
+            # 메뉴명은 HTML 테이블에 그대로 삽입되므로 수집 시점에 한 번만 이스케이프하고,
+            # 알레르기 번호도 렌더링 때마다 분리하지 않도록 여기서 미리 나눠 둡니다.
+            dishes = tuple(
+                split_allergy(html.escape(d.strip(), quote=False))
+                for d in dish_info.split('<br/>') if d.strip()
+            )
+            menus[(record['MLSV_YMD'], record['MMEAL_SC_CODE'])] = dishes
+    # 데이터가 없는 달(INFO-200)은 나중에 올라올 수 있으므로 저장하지 않습니다.
+    if is_past_month and menus:
+        store_month_menus(store_key, menus)
+    return menus
 
-# [★최적화★] 병렬 처리를 위한 단일 작업 함수
-def get_single_school_data(school_name, office_code, date_str, meal_code):
-    """학교 1곳의 코드 검색과 메뉴 조회를 한번에 처리하는 함수"""
-    category = get_school_category(school_name)
-    school_code = search_school_code(office_code, school_name)
+def fetch_meal_menu(office_code, school_code, date_str, meal_code):
+    """선택된 날짜와 식사종류의 메뉴를 조회하고 튜플로 반환합니다. 메뉴가 없으면 None을 반환합니다."""
+    menus = fetch_month_menus(office_code, school_code, int(date_str[:4]), int(date_str[4:6]))
+    return menus.get((date_str, meal_code)) or None
 
-    if school_code:
-        menu = fetch_meal_menu(office_code, school_code, date_str, meal_code)
-        return {'학교급': category, '학교명': school_name, '메뉴': menu}
-    else:
-        return {'학교급': category, '학교명': school_name, '메뉴': ["❌ 학교 코드를 찾을 수 없습니다."]}
+# [★최적화★] 병렬 처리를 위한 단일 작업 함수
+def get_single_school_data(school_name, office_code, school_codes, date_str, meal_code):
+    """학교 1곳의 코드 검색과 메뉴 조회를 한번에 처리하는 함수
 
+    메뉴가 없거나 학교 코드/메뉴 조회에 실패하면 '메뉴'는 None입니다.
+    """
+    category = SCHOOL_CATEGORIES[school_name]
+    try:
+        school_code = search_school_code(office_code, school_name, school_codes)
+        menu = fetch_meal_menu(office_code, school_code, date_str, meal_code) if school_code else None
+    except (requests.RequestException, NeisApiError):
+        menu = None
+    return {'학교급': category, '학교명': school_name, '메뉴': menu}
+
+# [★최적화★] 호출마다 다시 만들 필요가 없는 헤더 HTML과 % 템플릿
+_HEADER_ROW_OPEN = '<tr style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white;">'
+_HEADER_CORNER_CELL = '<th style="border: 1px solid #ddd; padding: 15px; text-align: center; font-size: 16px; font-weight: bold; position: sticky; left: 0; z-index: 10; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">구분</th>'
+_CATEGORY_TH = '<th colspan="%d" style="border: 1px solid #ddd; padding: 15px; text-align: center; font-size: 16px; font-weight: bold;">%s</th>'
+_MEAL_NAME_TH = '<th style="border: 1px solid #ddd; padding: 12px; text-align: center; font-size: 14px; font-weight: bold; position: sticky; left: 0; z-index: 9; background-color: #f8f9ff;">%s</th>'
+_SCHOOL_NAME_TH = '<th style="border: 1px solid #ddd; padding: 8px; text-align: center; font-size: 13px; font-weight: bold; min-width: 140px; max-width: 160px; word-break: keep-all;">%s</th>'
+_MEAL_LABEL_TD = '<td rowspan="%d" style="border: 1px solid #ddd; padding: 15px; text-align: center; font-weight: bold; background-color: #f0f2f6; position: sticky; left: 0; z-index: 8; font-size: 14px; vertical-align: middle;">%s 메뉴</td>'
+
+# [★최적화★] 메뉴 셀마다 반복되는 스타일 문자열은 % 템플릿으로 한 번만 정의합니다.
+_DISH_DIV = '<div style="font-weight: 500; %s">%s</div>'
+_ALLERGY_DIV = '<div style="font-size: 12px; color: #e74c3c;">(%s)</div>'
+_MENU_ITEM_DIV = '<div style="margin: 2px 0; padding: 6px 4px; background-color: rgba(102, 126, 234, 0.08); border-radius: 4px; font-size: 13px;">%s</div>'
+_MENU_TD = '<td style="border: 1px solid #ddd; padding: 8px; text-align: center; vertical-align: top; line-height: 1.5; font-size: 13px; background-color: #ffffff;">%s</td>'
+# 내용이 고정된 빈 셀은 미리 완성해 둡니다. (메뉴 수가 적은 학교의 남는 칸)
+_EMPTY_MENU_TD = _MENU_TD % ''
+
+# [★최적화★] 같은 결과에 대한 HTML은 다시 만들지 않고 캐시에서 반환합니다.
+@st.cache_data(ttl=60 * 60, max_entries=128, show_spinner=False)
 def create_school_menu_table(school_data, meal_name, show_allergy=True):
-    """학교 급식 데이터를 HTML 테이블로 생성합니다."""
+    """학교 급식 데이터를 HTML 테이블로 생성합니다.
+
+    school_data에는 메뉴가 있는 학교만 전달합니다. (메뉴가 None인 학교는 호출 전에 걸러냅니다.)
+    """
     categories = {}
     for data in school_data:
         category = data['학교급']
         if category not in categories:
             categories[category] = []
         categories[category].append(data)
+    # 표시할 학교급을 순서대로 한 번만 추려 세 구간에서 재사용합니다.
+    visible = [(c, categories[c]) for c in ("초등학교", "중학교", "고등학교", "특수학교", "기타") if c in categories]
 
-    html = '''
+    parts = ['''
     <div style="margin: 20px 0; overflow-x: auto; border-radius: 10px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);">
         <table style="width: 100%; border-collapse: collapse; font-family: 'Malgun Gothic', 'Apple SD Gothic Neo', sans-serif; background: white;">
-    '''
-
-    html += '<tr style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white;">'
-    html += '<th style="border: 1px solid #ddd; padding: 15px; text-align: center; font-size: 16px; font-weight: bold; position: sticky; left: 0; z-index: 10; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">구분</th>'
-    category_order = ["초등학교", "중학교", "고등학교", "특수학교", "기타"]
-    for category in category_order:
-        if category in categories:
-            school_count = len(categories[category])
-            html += f'<th colspan="{school_count}" style="border: 1px solid #ddd; padding: 15px; text-align: center; font-size: 16px; font-weight: bold;">{category}</th>'
-    html += '</tr>'
-
-    html += '<tr style="background-color: #f8f9ff;">'
-    html += f'<th style="border: 1px solid #ddd; padding: 12px; text-align: center; font-size: 14px; font-weight: bold; position: sticky; left: 0; z-index: 9; background-color: #f8f9ff;">{meal_name}</th>'
-    for category in category_order:
-        if category in categories:
-            for school_info in categories[category]:
-                school_name = school_info['학교명'].replace('학교', '').replace('등', '')
-                html += f'<th style="border: 1px solid #ddd; padding: 8px; text-align: center; font-size: 13px; font-weight: bold; min-width: 140px; max-width: 160px; word-break: keep-all;">{school_name}</th>'
-    html += '</tr>'
-
-    max_menu_count = 0
-    for data in school_data:
-        if isinstance(data['메뉴'], list):
-            max_menu_count = max(max_menu_count, len(data['메뉴']))
+    ''']
+
+    parts.append(_HEADER_ROW_OPEN)
+    parts.append(_HEADER_CORNER_CELL)
+    for category, schools in visible:
+        parts.append(_CATEGORY_TH % (len(schools), category))
+    parts.append('</tr>')
+
+    parts.append('<tr style="background-color: #f8f9ff;">')
+    parts.append(_MEAL_NAME_TH % meal_name)
+    for category, schools in visible:
+        for school_info in schools:
+            school_name = school_info['학교명'].replace('학교', '').replace('등', '')
+            parts.append(_SCHOOL_NAME_TH % school_name)
+    parts.append('</tr>')
+
+    # 메뉴 행에서는 학교급 구분이 필요 없으므로 표시 순서대로 메뉴만 평탄화해 둡니다.
+    ordered_menus = [school_info['메뉴'] for _, schools in visible for school_info in schools]
+    max_menu_count = max(map(len, ordered_menus), default=0)
 
     for i in range(max_menu_count):
-        html += '<tr>'
+        parts.append('<tr>')
         if i == 0:
-            html += f'<td rowspan="{max_menu_count}" style="border: 1px solid #ddd; padding: 15px; text-align: center; font-weight: bold; background-color: #f0f2f6; position: sticky; left: 0; z-index: 8; font-size: 14px; vertical-align: middle;">{meal_name} 메뉴</td>'
-
-        for category in category_order:
-            if category in categories:
-                for school_info in categories[category]:
-                    menu_list = school_info['메뉴']
-                    menu_item = ""
-                    if isinstance(menu_list, list) and i < len(menu_list):
-                        menu_item_raw = menu_list[i]
-                        match = re.match(r'^(.*?)\s*\(([\d\.]+)\)$', menu_item_raw)
-                        
-                        # [수정] 긴 메뉴명 폰트 크기 조절 로직 추가
-                        menu_item_content = ""
-                        if match:
-                            dish_name = match.group(1).strip()
-                            allergy_info = match.group(2).strip()
-                            
-                            font_style = "font-size: 11.5px; line-height: 1.2;" if len(dish_name) > 10 else ""
-                            menu_item_content = f'<div style="font-weight: 500; {font_style}">{dish_name}</div>'
-                            
-                            if show_allergy:
-                                menu_item_content += f'<div style="font-size: 12px; color: #e74c3c;">({allergy_info})</div>'
-                        else:
-                            dish_name = menu_item_raw.strip()
-                            font_style = "font-size: 11.5px; line-height: 1.2;" if len(dish_name) > 10 else ""
-                            menu_item_content = f'<div style="font-weight: 500; {font_style}">{dish_name}</div>'
-                        
-                        menu_item = f'<div style="margin: 2px 0; padding: 6px 4px; background-color: rgba(102, 126, 234, 0.08); border-radius: 4px; font-size: 13px;">{menu_item_content}</div>'
-
-                    elif i == 0 and not isinstance(menu_list, list):
-                         menu_item = f'<span style="color: #e74c3c; font-weight: bold;">{menu_list}</span>'
-
-                    html += f'<td style="border: 1px solid #ddd; padding: 8px; text-align: center; vertical-align: top; line-height: 1.5; font-size: 13px; background-color: #ffffff;">{menu_item}</td>'
-
-        html += '</tr>'
-
-    html += '</table></div>'
-    return html
+            parts.append(_MEAL_LABEL_TD % (max_menu_count, meal_name))
+
+        for menu_list in ordered_menus:
+            if i < len(menu_list):
+                dish_name, allergy_info = menu_list[i]
+
+                # [수정] 긴 메뉴명 폰트 크기 조절 로직 추가
+                font_style = "font-size: 11.5px; line-height: 1.2;" if len(dish_name) > 10 else ""
+                menu_item_content = _DISH_DIV % (font_style, dish_name)
+
+                if allergy_info and show_allergy:
+                    menu_item_content += _ALLERGY_DIV % allergy_info
+
+                parts.append(_MENU_TD % (_MENU_ITEM_DIV % menu_item_content))
+            else:
+                parts.append(_EMPTY_MENU_TD)
+
+        parts.append('</tr>')
+
+    parts.append('</table></div>')
+    return ''.join(parts)
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="태백지역 학교 급식 메뉴", layout="wide", initial_sidebar_state="collapsed")
@@ -227,42 +422,48 @@ with col2:
         date_to_fetch_str = selected_date.strftime('%Y%m%d')
 
         with st.spinner(f'{selected_date.strftime("%m월 %d일")} {selected_meal_name} 급식 정보를 빠르게 가져오는 중입니다...'):
-            meal_results = []
             progress_bar = st.progress(0, text="조회 시작...")
             total_schools = len(TAEBAEK_SCHOOLS)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_school = {
-                    executor.submit(get_single_school_data, school_name, OFFICE_CODE, date_to_fetch_str, selected_meal_code): school_name
-                    for school_name in TAEBAEK_SCHOOLS
-                }
-
-                results_map = {}
-                completed_count = 0
-                for future in concurrent.futures.as_completed(future_to_school):
-                    school_name = future_to_school[future]
-                    try:
-                        result = future.result()
-                        results_map[school_name] = result
-                    except Exception as exc:
-                        results_map[school_name] = {'학교급': get_school_category(school_name), '학교명': school_name, '메뉴': [f"오류 발생: {exc}"]}
-
-                    completed_count += 1
+            # 완료 순서와 관계없이 학교 목록 순서대로 결과를 바로 채웁니다.
+            meal_results = [None] * total_schools
+
+            # 학교당 요청은 월별 캐시 미적중 시 1~2건뿐이므로, 공용 세션(keep-alive)과
+            # 스레드 풀 조합으로 충분합니다. (asyncio/aiohttp, HTTP2 클라이언트 불필요)
+            # 캐시 적중 시 작업은 I/O 없이 끝나므로 스레드 전환 비용도 무시할 수준입니다.
+            # 학교 코드 목록은 작업을 나누기 전에 한 번만 조회합니다. 실패해도 각 작업이
+            # 같은 요청을 차례로 다시 보내지 않고, 학교명 검색으로 바로 넘어갑니다.
+            try:
+                school_codes = fetch_all_school_codes(OFFICE_CODE)
+            except (requests.RequestException, NeisApiError, orjson.JSONDecodeError):
+                school_codes = {}
+
+            executor = get_executor()
+            future_to_index = {
+                executor.submit(get_single_school_data, school_name, OFFICE_CODE, school_codes, date_to_fetch_str, selected_meal_code): index
+                for index, school_name in enumerate(TAEBAEK_SCHOOLS)
+            }
+
+            completed_count = 0
+            last_progress_update = 0.0
+            for future in concurrent.futures.as_completed(future_to_index):
+                index = future_to_index[future]
+                school_name = TAEBAEK_SCHOOLS[index]
+                try:
+                    meal_results[index] = future.result()
+                except Exception:
+                    meal_results[index] = {'학교급': SCHOOL_CATEGORIES[school_name], '학교명': school_name, '메뉴': None}
+
+                completed_count += 1
+                # [★최적화★] 진행률은 일정 시간 간격으로만 갱신해 웹소켓 메시지를 줄입니다.
+                # (캐시 적중으로 한꺼번에 끝나면 처음과 마지막에만 갱신됩니다.)
+                now = time.monotonic()
+                if now - last_progress_update >= PROGRESS_UPDATE_INTERVAL or completed_count == total_schools:
+                    last_progress_update = now
                     progress_text = f"{school_name} 조회 완료... ({completed_count}/{total_schools})"
                     progress_bar.progress(completed_count / total_schools, text=progress_text)
 
-            for school_name in TAEBAEK_SCHOOLS:
-                meal_results.append(results_map[school_name])
-
         if meal_results:
-            schools_with_menus = []
-            for r in meal_results:
-                menu_info = r.get('메뉴')
-                if isinstance(menu_info, list) and menu_info:
-                    if "정보가 없습니다" not in menu_info[0] and \
-                       "실패했습니다" not in menu_info[0] and \
-                       "찾을 수 없습니다" not in menu_info[0]:
-                        schools_with_menus.append(r)
+            schools_with_menus = [r for r in meal_results if r['메뉴']]
 
             if schools_with_menus:
                 st.success(f"✅ 총 {len(meal_results)}개 학교 중 {len(schools_with_menus)}곳의 {selected_meal_name} 정보를 조회했습니다!")